@@ -0,0 +1,178 @@
+# bench_assassin_bot.py
+# Microbenchmarks for the hot paths of telegram_assassin_bot.py
+#
+#   python bench_assassin_bot.py                    # run and print
+#   python bench_assassin_bot.py --save             # write the baseline file
+#   python bench_assassin_bot.py --compare          # exit 1 on regressions / missing cases, 2 without a baseline
+#   python bench_assassin_bot.py --compare --threshold 0.5 --baseline other.json
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import random
+import timeit
+import argparse
+import tempfile
+import platform
+from typing import Callable, Dict, List, Tuple
+
+import telegram_assassin_bot as bot
+
+BASELINE_FILE = "bench_baseline.json"
+DEFAULT_THRESHOLD = 0.25   # allowed slowdown vs baseline (0.25 = 25%)
+EXIT_REGRESSION = 1        # a case got slower, or a baseline case is no longer run
+EXIT_NO_BASELINE = 2       # nothing to compare against
+PLAYER_SIZES = (4, 20, 100)
+GAME_COUNTS = (10, 1000)   # size of GAMES for save/load round-trips
+TARGET_SECONDS = 0.2       # wall time per timing run
+
+# -------------------- Synthetic data --------------------
+def make_game(chat_id: int, n_players: int, rng: random.Random) -> bot.Game:
+    players = {}
+    for i in range(n_players):
+        uid = 1_000_000 + chat_id * 1000 + i
+        players[uid] = bot.Player(user_id=uid, name=f"Player {i} ✨", username=f"user{uid}" if i % 2 else None)
+    uids = list(players)
+    rng.shuffle(uids)
+    for uid, role in zip(uids, ("killer", "detective", "doctor")):
+        players[uid].role = role
+    for uid in uids[: n_players // 4]:
+        players[uid].alive = False
+
+    game = bot.Game(chat_id=-chat_id, players=players, started=True, night=3, lang=rng.choice(("en", "ar")))
+    game.voting_open = True
+    alive = [p.user_id for p in players.values() if p.alive]
+    game.votes = {uid: rng.choice(alive) for uid in uids}
+    return game
+
+def make_games(count: int, n_players: int, rng: random.Random) -> Dict[int, bot.Game]:
+    games = {}
+    for i in range(1, count + 1):
+        g = make_game(i, n_players, rng)
+        games[g.chat_id] = g
+    return games
+
+# -------------------- Cases --------------------
+def build_cases(data_file: str) -> List[Tuple[str, Callable[[], object]]]:
+    rng = random.Random(1234)
+    cases: List[Tuple[str, Callable[[], object]]] = []
+
+    bot.DATA_FILE = data_file
+
+    g = make_game(1, 8, rng)
+    cases.append(("tr[plain]", lambda: bot.tr(g, "join")))
+    cases.append(("tr[format]", lambda: bot.tr(g, "vote_result", name="Someone", cnt=3, need=4)))
+    cases.append(("group_keyboard[player]", lambda: bot.group_keyboard(g, False)))
+    cases.append(("group_keyboard[admin]", lambda: bot.group_keyboard(g, True)))
+
+    for n in PLAYER_SIZES:
+        g = make_game(n, n, rng)
+        cases.append((f"vote_keyboard[{n}]", lambda g=g: bot.vote_keyboard(g)))
+        cases.append((f"target_list_keyboard[{n}]", lambda g=g: bot.target_list_keyboard(g, bot.CB_DM_KILL_PICK, exclude_ids=[next(iter(g.players))])))
+        cases.append((f"format_players[{n}]", lambda g=g: bot.format_players(g)))
+        cases.append((f"majority_needed[{n}]", lambda g=g: bot.majority_needed(g)))
+        cases.append((f"tally_votes[{n}]", lambda g=g: bot.tally_votes(g)))
+
+    for count in GAME_COUNTS:
+        games = make_games(count, 8, rng)
+
+        def roundtrip(games=games) -> None:
+            bot.GAMES = games
+            bot.save_games()
+            bot.load_games()
+
+        cases.append((f"save_load_games[{count}]", roundtrip))
+
+    return cases
+
+def time_case(fn: Callable[[], object]) -> float:
+    # Best-of-5 per-call time in seconds; loop count sized to TARGET_SECONDS
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * TARGET_SECONDS / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat=5, number=number)) / number
+
+def run(only: str = "") -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        saved_games, saved_file = bot.GAMES, bot.DATA_FILE
+        try:
+            for name, fn in build_cases(os.path.join(tmp, "games.json")):
+                if only and only not in name:
+                    continue
+                results[name] = time_case(fn)
+                print(f"{name:32s} {results[name] * 1e6:12.2f} us", flush=True)
+        finally:
+            bot.GAMES, bot.DATA_FILE = saved_games, saved_file
+    return results
+
+# -------------------- Baseline --------------------
+def save_baseline(path: str, results: Dict[str, float]) -> None:
+    obj = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "unit": "seconds_per_call",
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2, sort_keys=True)
+    print(f"Baseline written to {path}")
+
+def compare(path: str, results: Dict[str, float], threshold: float, only: str = "") -> int:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    except FileNotFoundError:
+        print(f"\nNo baseline at {path}; run with --save first.", file=sys.stderr)
+        return EXIT_NO_BASELINE
+    except (ValueError, KeyError) as e:
+        print(f"\nUnreadable baseline {path} ({e}); re-create it with --save.", file=sys.stderr)
+        return EXIT_NO_BASELINE
+    regressions = 0
+    print(f"\n{'case':32s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:32s} {'-':>12s} {cur * 1e6:10.2f}us {'new':>8s}")
+            continue
+        change = cur / base - 1.0
+        flag = ""
+        if change > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{name:32s} {base * 1e6:10.2f}us {cur * 1e6:10.2f}us {change:+8.1%}{flag}")
+    # A renamed or removed case must not silently drop out of tracking
+    missing = [] if only else sorted(baseline.keys() - results.keys())
+    for name in missing:
+        print(f"{name:32s} {baseline[name] * 1e6:10.2f}us {'-':>12s} {'MISSING':>8s}")
+    if regressions or missing:
+        if regressions:
+            print(f"\n{regressions} case(s) regressed more than {threshold:.0%}")
+        if missing:
+            print(f"\n{len(missing)} baseline case(s) not run; re-save the baseline if that is intended")
+        return EXIT_REGRESSION
+    print(f"\nNo regressions beyond {threshold:.0%}")
+    return 0
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Microbenchmarks for telegram_assassin_bot")
+    ap.add_argument("--baseline", default=BASELINE_FILE, help="baseline JSON file")
+    ap.add_argument("--save", action="store_true", help="write results to the baseline file")
+    ap.add_argument("--compare", action="store_true", help="compare against the baseline file")
+    ap.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown, e.g. 0.25")
+    ap.add_argument("--only", default="", help="run only cases whose name contains this")
+    args = ap.parse_args()
+
+    results = run(args.only)
+    if args.save:
+        save_baseline(args.baseline, results)
+    if args.compare:
+        return compare(args.baseline, results, args.threshold, args.only)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,41 @@
 # telegram_assassin_bot.py
 # Python 3.10+ | python-telegram-bot==20.6
-# Bilingual (AR/EN) + Admin language toggle + DM translated too
+# Multilingual (locales/*.json) + Admin language cycle + DM translated too
 
 from __future__ import annotations
 
 import os
 import json
 import random
+import string
 import logging
+import logging.handlers
+import queue
+import atexit
+import contextvars
 import threading
 import asyncio
-from dataclasses import dataclass, asdict
-from typing import Dict, Optional, List
+import time
+import bisect
+import io
+import hmac
+from collections import OrderedDict, deque
+from urllib.parse import urlparse, parse_qs
+from dataclasses import dataclass, asdict, field
+from typing import Deque, Dict, Optional, List, Set, Tuple
 from http.server import BaseHTTPRequestHandler, HTTPServer
 
-from telegram import Update, Chat, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, Chat, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
 from telegram.constants import ParseMode
+from telegram.error import BadRequest, Forbidden
 from telegram.ext import (
     ApplicationBuilder,
+    ApplicationHandlerStop,
     CallbackQueryHandler,
     CommandHandler,
     ContextTypes,
     MessageHandler,
+    TypeHandler,
     filters,
 )
 
@@ -32,156 +46,248 @@ if os.name == "nt":
 DATA_FILE = "assassin_bot_data.json"
 MIN_PLAYERS = 4
 
-logging.basicConfig(level=logging.INFO)
+DM_CACHE_FILE = "assassin_bot_dm_cache.json"
+DM_OK_TTL = 7 * 24 * 3600     # seconds a successful DM / private /start stays trusted
+DM_FAIL_TTL = 24 * 3600       # seconds a failed DM keeps the user marked unreachable
+
+STATS_FILE = "assassin_bot_stats.json"    # compacted snapshot
+STATS_LOG = "assassin_bot_stats.jsonl"    # one line per finished game since the snapshot
+LEADERBOARD_SIZE = 10
+LEADERBOARD_MAX = 50
+
+TRACE_EVENTS = 512                                  # ring buffer size per game
+TRACE_TOKEN = os.environ.get("TRACE_TOKEN", "")     # enables GET /trace/<chat_id>?token=... on the health server
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "")              # per-logger levels: "telegram.ext=WARNING,httpx=INFO"
+LOG_SAMPLE = os.environ.get("LOG_SAMPLE", "httpx=100")     # keep 1 in N records: "httpx=100,telegram.ext=10"
+
+RESUME_CONCURRENCY = 8        # parallel sends while re-posting prompts after a restart
+RESUME_RATE = 25.0            # messages per second, below Telegram's ~30/s bot limit
+DRAIN_TIMEOUT = 15.0          # seconds to wait for outbound sends on shutdown
+
+STARTUP_BACKLOG = os.environ.get("STARTUP_BACKLOG", "catchup")  # "catchup" | "replay" | "drop"
+CATCHUP_BATCH = 100           # getUpdates maximum
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]  # all our handlers consume
+
+CB_DEDUP_WINDOW = 2.0         # seconds an identical tap is answered from cache
+USER_BURST, USER_RATE = 5, 1.0      # callback token bucket per user: burst, tokens/sec
+CHAT_BURST, CHAT_RATE = 30, 10.0    # callback token bucket per game chat
+
 logger = logging.getLogger(__name__)
 
-# -------------------- UI TEXT (EN/AR) --------------------
-TEXT_EN = {
-    "welcome_group": "🎮 Welcome to Assassin Game!\nChoose an option:",
-    "join": "🔫 Join Game",
-    "leave": "🚪 Leave Game",
-    "start_game": "🎬 Start Game",
-    "show_players": "📜 Show Players",
-    "start_vote": "🗳️ Start Vote",
-    "end_game": "🛑 End Game",
-    "language_btn": "🌐 Language: EN (tap to switch)",
-
-    "joined": "✅ You joined the game!",
-    "left": "🚪 You left the game.",
-    "already_joined": "You are already in the game.",
-    "not_joined": "You are not in the game.",
-    "need_players": f"Need at least {MIN_PLAYERS} players.",
-    "admins_only": "Admins only.",
-    "start_first": "Start the game first.",
-    "game_already_started": "Game already started.",
-    "vote_started_ok": "🗳️ Vote started.",
-    "game_ended_ok": "🛑 Game ended and reset.",
-    "players_popup_title": "📜 Players:",
-
-    "add_to_group": "Hi! Add me to a group to play.\nIn a group, type /start to get buttons.\nPlayers must /start me in private once so I can DM roles.",
-    "use_in_group": "Use this in the group.",
-    "unknown_cmd": "Unknown command. Use /start in the group.",
-
-    "role_title": "{icon} Your role: <b>{role}</b>",
-    "role_killer": "Killer",
-    "role_doctor": "Doctor",
-    "role_detective": "Detective",
-    "role_civilian": "Civilian",
-
-    "role_desc_killer": "Pick one victim each night.",
-    "role_desc_doctor": "Save one player each night.",
-    "role_desc_detective": "Investigate one player each night (role revealed to you).",
-    "role_desc_civilian": "No special powers. Vote in the group.",
-    "keep_secret": "⚠️ Keep it secret!",
-
-    "dm_cant": "⚠️ I couldn't DM {name}. They must open a private chat with the bot and press /start once.",
-
-    "night_begins": "🌙 Night {n} begins. Roles, check your DMs.",
-    "night_over_saved": "🌙 Night {n} is over. 🛡️ Someone was saved! No one died.",
-    "night_over_killed": "🌙 Night {n} is over. 💀 {name} was killed.",
-    "night_over_invalid": "🌙 Night {n} is over. (No valid victim.)",
-
-    "vote_started": "🗳️ Day Vote started! Tap a name to vote.",
-    "voting_not_open": "Voting is not open.",
-    "not_alive_player": "You are not an alive player.",
-    "target_not_alive": "Target not alive.",
-    "voted_for": "✅ Voted for {name}",
-    "vote_result": "🪓 Vote result: {name} was eliminated ({cnt}/{need}).",
-
-    "players_win": "✅ Players win! The killer is gone.",
-    "killer_win": "⚠️ Killer wins! Outnumbered the others.",
-
-    "dm_choose_victim": "🔪 Choose a victim:",
-    "dm_choose_save": "💉 Choose who to save:",
-    "dm_choose_inv": "🕵️ Choose who to investigate:",
-    "dm_btn_choose_victim": "🔪 Choose victim",
-    "dm_btn_choose_save": "💉 Choose who to save",
-    "dm_btn_choose_inv": "🕵️ Choose who to investigate",
-
-    "dm_selected_wait_doctor": "✅ You selected: {name}\nWait for the Doctor.",
-    "dm_selected_wait_killer": "✅ You decided to save: {name}\nWait for the Killer.",
-    "dm_invest_done": "✅ Investigation complete: {name}",
-    "dm_invest_result": "🕵️ Result: <b>{name}</b> is <b>{role}</b> {icon}",
-
-    "noop_targets": "(No targets)",
-    "lang_switched": "✅ Language switched.",
-}
-
-TEXT_AR = {
-    "welcome_group": "🎮 أهلاً بك في لعبة القاتل!\nاختر خياراً:",
-    "join": "🔫 انضم للعبة",
-    "leave": "🚪 غادر اللعبة",
-    "start_game": "🎬 بدء اللعبة",
-    "show_players": "📜 عرض اللاعبين",
-    "start_vote": "🗳️ بدء التصويت",
-    "end_game": "🛑 إنهاء اللعبة",
-    "language_btn": "🌐 اللغة: AR (اضغط للتبديل)",
-
-    "joined": "✅ تم انضمامك للعبة!",
-    "left": "🚪 غادرت اللعبة.",
-    "already_joined": "أنت منضم مسبقًا.",
-    "not_joined": "أنت غير منضم.",
-    "need_players": f"تحتاج على الأقل {MIN_PLAYERS} لاعبين.",
-    "admins_only": "للمشرفين فقط.",
-    "start_first": "ابدأ اللعبة أولاً.",
-    "game_already_started": "اللعبة بدأت بالفعل.",
-    "vote_started_ok": "🗳️ تم بدء التصويت.",
-    "game_ended_ok": "🛑 تم إنهاء اللعبة وإعادة ضبطها.",
-    "players_popup_title": "📜 اللاعبون:",
-
-    "add_to_group": "مرحباً! أضفني لمجموعة للعب.\nفي المجموعة اكتب /start لإظهار الأزرار.\nلازم كل لاعب يفتح الخاص مع البوت ويكتب /start مرة واحدة حتى أرسل الأدوار.",
-    "use_in_group": "استخدم هذا داخل المجموعة.",
-    "unknown_cmd": "أمر غير معروف. استخدم /start في المجموعة.",
-
-    "role_title": "{icon} دورك: <b>{role}</b>",
-    "role_killer": "القاتل",
-    "role_doctor": "الطبيب",
-    "role_detective": "المحقق",
-    "role_civilian": "مواطن",
-
-    "role_desc_killer": "اختر ضحية كل ليلة.",
-    "role_desc_doctor": "اختر شخصاً لإنقاذه كل ليلة.",
-    "role_desc_detective": "تحقق من لاعب كل ليلة (يظهر لك دوره).",
-    "role_desc_civilian": "بدون صلاحيات خاصة. ناقش وصوّت.",
-    "keep_secret": "⚠️ احتفظ به سرّاً!",
-
-    "dm_cant": "⚠️ لم أستطع مراسلة {name}. لازم يفتح الخاص مع البوت ويكتب /start مرة واحدة.",
-
-    "night_begins": "🌙 بدأ الليل {n}. تفقد رسائلك الخاصة.",
-    "night_over_saved": "🌙 انتهى الليل {n}. 🛡️ تم إنقاذ شخص! لا أحد مات.",
-    "night_over_killed": "🌙 انتهى الليل {n}. 💀 تم قتل {name}.",
-    "night_over_invalid": "🌙 انتهى الليل {n}. (لا توجد ضحية صالحة.)",
-
-    "vote_started": "🗳️ بدأ التصويت! اختر لاعبًا.",
-    "voting_not_open": "التصويت غير متاح الآن.",
-    "not_alive_player": "أنت لست لاعباً حياً.",
-    "target_not_alive": "الهدف ليس حيّاً.",
-    "voted_for": "✅ تم التصويت لـ {name}",
-    "vote_result": "🪓 نتيجة التصويت: تم إقصاء {name} ({cnt}/{need}).",
-
-    "players_win": "✅ فاز اللاعبون! تم التخلص من القاتل.",
-    "killer_win": "⚠️ فاز القاتل! أصبحوا أقلية.",
-
-    "dm_choose_victim": "🔪 اختر ضحية:",
-    "dm_choose_save": "💉 اختر من تريد إنقاذه:",
-    "dm_choose_inv": "🕵️ اختر من تريد التحقق منه:",
-    "dm_btn_choose_victim": "🔪 اختر ضحية",
-    "dm_btn_choose_save": "💉 اختر إنقاذ",
-    "dm_btn_choose_inv": "🕵️ اختر تحقيق",
-
-    "dm_selected_wait_doctor": "✅ اخترت: {name}\nانتظر الطبيب.",
-    "dm_selected_wait_killer": "✅ قررت إنقاذ: {name}\nانتظر القاتل.",
-    "dm_invest_done": "✅ انتهى التحقيق: {name}",
-    "dm_invest_result": "🕵️ النتيجة: <b>{name}</b> هو <b>{role}</b> {icon}",
-
-    "noop_targets": "(لا توجد أهداف)",
-    "lang_switched": "✅ تم تبديل اللغة.",
-}
+# -------------------- Logging (queued, structured) --------------------
+LOG_CTX: contextvars.ContextVar[dict] = contextvars.ContextVar("log_ctx", default={})
+LOG_FIELDS = ("chat_id", "user_id", "handler", "phase")
+
+def log_context(**fields) -> None:
+    LOG_CTX.set({k: v for k, v in fields.items() if v is not None})
+
+def _parse_pairs(spec: str) -> Dict[str, str]:
+    pairs = {}
+    for item in spec.split(","):
+        if "=" in item:
+            k, v = item.split("=", 1)
+            pairs[k.strip()] = v.strip()
+    return pairs
+
+class ContextFilter(logging.Filter):
+    # Runs in the emitting task, so the contextvars of the current update are visible
+    def filter(self, record: logging.LogRecord) -> bool:
+        ctx = LOG_CTX.get()
+        for k in LOG_FIELDS:
+            if not hasattr(record, k):
+                setattr(record, k, ctx.get(k))
+        return True
+
+class SampleFilter(logging.Filter):
+    # Keeps 1 in N records of noisy loggers; warnings and anything with a traceback always pass
+    def __init__(self, rates: Dict[str, int]):
+        super().__init__()
+        self.rates = rates
+        self.counts: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or record.exc_info:
+            return True
+        name = record.name
+        while name:
+            n = self.rates.get(name)
+            if n:
+                c = self.counts.get(name, 0)
+                self.counts[name] = c + 1
+                return c % n == 0
+            name = name.rpartition(".")[0]
+        return True
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        obj = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k in LOG_FIELDS:
+            v = getattr(record, k, None)
+            if v is not None:
+                obj[k] = v
+        if record.exc_info:
+            obj["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            obj["exc"] = record.exc_text
+        return json.dumps(obj, ensure_ascii=False, default=str)
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    # Keep the traceback in its own field instead of folding it into msg
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+def setup_logging() -> None:
+    q: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = StructuredQueueHandler(q)
+    handler.addFilter(ContextFilter())
+    rates = {k: int(v) for k, v in _parse_pairs(LOG_SAMPLE).items() if v.isdigit() and int(v) > 1}
+    if rates:
+        handler.addFilter(SampleFilter(rates))
+
+    sink = logging.StreamHandler()
+    sink.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(q, sink, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(LOG_LEVEL.upper())
+    for name, level in _parse_pairs(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+# -------------------- UI TEXT (locale catalogs) --------------------
+# One flat JSON file per language in locales/: {"key": "template with {placeholders}"}.
+# Catalogs are compiled on first use; validate_locales() checks all of them at startup.
+class Template:
+    __slots__ = ("text", "fmt", "fields")
+
+    def __init__(self, raw: str, constants: Dict[str, object]):
+        pieces: List[str] = []
+        fields: List[str] = []
+        for literal, name, spec, conv in string.Formatter().parse(raw):
+            pieces.append(literal.replace("{", "{{").replace("}", "}}"))
+            if name is None:
+                continue
+            if spec or conv or not name.isidentifier():
+                raise ValueError(f"unsupported placeholder {{{name}}} in {raw!r}")
+            if name in constants:
+                # parameter-independent: folded into the template once
+                pieces.append(str(constants[name]).replace("{", "{{").replace("}", "}}"))
+                continue
+            pieces.append("{" + name + "}")
+            fields.append(name)
+        self.fmt = "".join(pieces)
+        self.fields = frozenset(fields)
+        # static templates are pre-rendered; others keep their raw text for kwarg-less calls
+        self.text = raw if fields else self.fmt.format()
+
+
+LOCALE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales")
+DEFAULT_LANG = "en"                              # reference catalog: every key must exist here
+LOCALE_CONSTANTS = {"min_players": MIN_PLAYERS}  # placeholders resolved at compile time
+
+LANGUAGES: List[str] = sorted(
+    f[:-5] for f in os.listdir(LOCALE_DIR) if f.endswith(".json")
+) if os.path.isdir(LOCALE_DIR) else []
+CATALOGS: Dict[str, Dict[str, Template]] = {}
+
+def _read_catalog(lang: str) -> Dict[str, str]:
+    with open(os.path.join(LOCALE_DIR, f"{lang}.json"), "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    if not isinstance(raw, dict) or not all(isinstance(v, str) for v in raw.values()):
+        raise ValueError(f"locale {lang}: expected a flat object of strings")
+    return raw
+
+def catalog_problems(lang: str, raw: Dict[str, str], ref: Dict[str, Template]) -> List[str]:
+    problems = []
+    for key, tpl in ref.items():
+        if key not in raw:
+            problems.append(f"{lang}: missing key {key!r}")
+            continue
+        try:
+            fields = Template(raw[key], LOCALE_CONSTANTS).fields
+        except ValueError as e:
+            problems.append(f"{lang}: {key!r} {e}")
+            continue
+        if fields != tpl.fields:
+            problems.append(f"{lang}: {key!r} placeholders {sorted(fields)} != {sorted(tpl.fields)} in {DEFAULT_LANG}")
+    for key in raw.keys() - ref.keys():
+        problems.append(f"{lang}: unknown key {key!r}")
+    return problems
+
+def get_catalog(lang: str) -> Dict[str, Template]:
+    cat = CATALOGS.get(lang)
+    if cat is not None:
+        return cat
+    if lang not in LANGUAGES:
+        return get_catalog(DEFAULT_LANG)
+    raw = _read_catalog(lang)
+    if lang == DEFAULT_LANG:
+        cat = {k: Template(v, LOCALE_CONSTANTS) for k, v in raw.items()}
+    else:
+        ref = get_catalog(DEFAULT_LANG)
+        cat = dict(ref)  # anything missing or broken falls back to the reference text
+        bad = 0
+        for k, v in raw.items():
+            try:
+                t = Template(v, LOCALE_CONSTANTS)
+            except ValueError:
+                t = None
+            if t is None or k not in ref or t.fields != ref[k].fields:
+                bad += 1
+                continue
+            cat[k] = t
+        missing = len(ref.keys() - raw.keys())
+        if bad or missing:
+            logger.warning("Locale %s: %d missing and %d invalid keys use %s text", lang, missing, bad, DEFAULT_LANG)
+    CATALOGS[lang] = cat
+    return cat
+
+def validate_locales() -> None:
+    if DEFAULT_LANG not in LANGUAGES:
+        raise RuntimeError(f"Missing reference locale {DEFAULT_LANG}.json in {LOCALE_DIR}")
+    ref = get_catalog(DEFAULT_LANG)
+    problems: List[str] = []
+    for lang in LANGUAGES:
+        if lang == DEFAULT_LANG:
+            continue
+        try:
+            problems += catalog_problems(lang, _read_catalog(lang), ref)
+        except ValueError as e:
+            problems.append(str(e))
+    if problems:
+        raise RuntimeError("Invalid locale catalogs:\n" + "\n".join(problems))
 
 def tr(game: "Game", key: str, **kwargs) -> str:
-    table = TEXT_AR if (game and game.lang == "ar") else TEXT_EN
-    text = table.get(key, key)
-    return text.format(**kwargs) if kwargs else text
+    lang = game.lang if game else DEFAULT_LANG
+    cat = CATALOGS.get(lang) or get_catalog(lang)
+    t = cat.get(key)
+    if t is None:
+        return key
+    return t.fmt.format_map(kwargs) if kwargs else t.text
+
+def tr_all(key: str, sep: str = "\n") -> str:
+    # For chats without a game (private chats): every language, one after another
+    return sep.join(get_catalog(lang)[key].text for lang in LANGUAGES)
+
+def next_lang(lang: str) -> str:
+    if lang not in LANGUAGES:
+        return DEFAULT_LANG
+    return LANGUAGES[(LANGUAGES.index(lang) + 1) % len(LANGUAGES)]
 
 def role_name(game: "Game", role: str) -> str:
     key = {
@@ -239,7 +345,7 @@ class Game:
     players: Dict[int, Player]
     started: bool = False
     night: int = 0
-    lang: str = "en"  # "en" or "ar"
+    lang: str = "en"  # any catalog in locales/
 
     # night actions
     pending_kill_target: Optional[int] = None
@@ -250,23 +356,63 @@ class Game:
     voting_open: bool = False
     votes: Dict[int, int] = None  # voter_id -> target_id
 
+    # DM reachability
+    dm_warned: List[int] = None  # users already reported via "dm_cant" this game
+    api_calls_saved: int = 0     # DM sends / group notices skipped thanks to the cache
+
+    # phase prompts delivered in the current phase: "night", "vote", "dm:<user_id>"
+    prompts: List[str] = None
+    vote_msg_id: Optional[int] = None  # message carrying the current vote keyboard
+
+    # per-game action tallies, folded into the stats store when the game ends
+    actions: Dict[int, Dict[str, int]] = None  # user_id -> {"kills": n, "saves": n, "investigations": n}
+
     def __post_init__(self):
         if self.votes is None:
             self.votes = {}
+        if self.dm_warned is None:
+            self.dm_warned = []
+        if self.prompts is None:
+            self.prompts = []
+        if self.actions is None:
+            self.actions = {}
 
 
 GAMES: Dict[int, Game] = {}
 FILE_LOCK = threading.Lock()
 
+DRAINING = False                     # set on shutdown; background senders stop picking up work
+OUTBOUND: Set[asyncio.Task] = set()  # background send tasks awaited on shutdown
+BOOT_T0 = time.monotonic()
+
 # -------------------- Render health server (port binding) --------------------
 def start_health_server() -> None:
     port = int(os.environ.get("PORT", "10000"))
 
     class Handler(BaseHTTPRequestHandler):
         def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.startswith("/trace/") and TRACE_TOKEN:
+                return self.send_trace(url)
             self.send_response(200)
             self.end_headers()
             self.wfile.write(b"OK")
+        def send_trace(self, url):
+            qs = parse_qs(url.query)
+            try:
+                chat_id = int(url.path[len("/trace/"):])
+            except ValueError:
+                chat_id = None
+            token = qs.get("token", [""])[0].encode("utf-8")
+            if not hmac.compare_digest(token, TRACE_TOKEN.encode("utf-8")) or chat_id not in TRACES:
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = json.dumps(export_trace(chat_id, qs.get("format", ["json"])[0]), ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
         def log_message(self, format, *args):
             return
 
@@ -288,6 +434,11 @@ def save_games() -> None:
                 "pending_investigation_target": g.pending_investigation_target,
                 "voting_open": g.voting_open,
                 "votes": {str(k): v for k, v in (g.votes or {}).items()},
+                "dm_warned": list(g.dm_warned or []),
+                "api_calls_saved": g.api_calls_saved,
+                "prompts": list(g.prompts or []),
+                "vote_msg_id": g.vote_msg_id,
+                "actions": {str(k): v for k, v in (g.actions or {}).items()},
                 "players": {str(uid): asdict(p) for uid, p in g.players.items()},
             }
         with open(DATA_FILE, "w", encoding="utf-8") as f:
@@ -316,6 +467,11 @@ def load_games() -> None:
                     pending_investigation_target=data.get("pending_investigation_target"),
                     voting_open=bool(data.get("voting_open", False)),
                     votes={int(k): v for k, v in (data.get("votes") or {}).items()},
+                    dm_warned=[int(u) for u in (data.get("dm_warned") or [])],
+                    api_calls_saved=int(data.get("api_calls_saved", 0)),
+                    prompts=list(data.get("prompts") or []),
+                    vote_msg_id=data.get("vote_msg_id"),
+                    actions={int(k): v for k, v in (data.get("actions") or {}).items()},
                 )
                 games[cid] = g
             GAMES = games
@@ -323,6 +479,389 @@ def load_games() -> None:
             logger.exception("Failed to load games. Starting fresh.")
             GAMES = {}
 
+# -------------------- DM reachability cache --------------------
+DM_REACH: Dict[int, Dict[str, float]] = {}  # user_id -> {"ok": bool, "ts": epoch seconds}
+DM_DIRTY = False
+
+def save_dm_cache() -> None:
+    global DM_DIRTY
+    DM_DIRTY = False
+    with FILE_LOCK:
+        obj = {str(uid): e for uid, e in DM_REACH.items()}
+        with open(DM_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(obj, f)
+
+def load_dm_cache() -> None:
+    global DM_REACH
+    if not os.path.exists(DM_CACHE_FILE):
+        return
+    with FILE_LOCK:
+        try:
+            with open(DM_CACHE_FILE, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            now = time.time()
+            DM_REACH = {
+                int(uid): {"ok": bool(e["ok"]), "ts": float(e["ts"])}
+                for uid, e in raw.items()
+                if now - float(e["ts"]) < (DM_OK_TTL if e["ok"] else DM_FAIL_TTL)
+            }
+        except Exception:
+            logger.exception("Failed to load DM cache. Starting fresh.")
+            DM_REACH = {}
+
+def dm_reachable(user_id: int) -> Optional[bool]:
+    # True / False when known and fresh, None when unknown or expired
+    e = DM_REACH.get(user_id)
+    if not e:
+        return None
+    ttl = DM_OK_TTL if e["ok"] else DM_FAIL_TTL
+    if time.time() - e["ts"] >= ttl:
+        del DM_REACH[user_id]
+        return None
+    return bool(e["ok"])
+
+def mark_dm(user_id: int, ok: bool) -> None:
+    now = time.time()
+    e = DM_REACH.get(user_id)
+    # Only hit the disk when the status flips or the entry is getting old
+    if e and e["ok"] == ok and now - e["ts"] < (DM_OK_TTL if ok else DM_FAIL_TTL) / 2:
+        return
+    global DM_DIRTY
+    DM_REACH[user_id] = {"ok": ok, "ts": now}
+    DM_DIRTY = True
+
+def flush_dm_cache() -> None:
+    if DM_DIRTY:
+        save_dm_cache()
+
+# -------------------- Statistics & leaderboards --------------------
+STAT_METRICS = ("wins", "games", "kills", "saves", "investigations")
+
+@dataclass
+class PlayerStats:
+    name: str = ""
+    games: int = 0
+    wins: int = 0
+    kills: int = 0
+    saves: int = 0
+    investigations: int = 0  # investigations that hit the killer
+    wins_by_role: Dict[str, int] = field(default_factory=dict)
+
+
+class LeaderIndex:
+    # Sorted (-value, user_id) list kept in step with the stats; top-N is a slice
+    def __init__(self, values: Dict[int, int]):
+        self.value = {uid: v for uid, v in values.items() if v}
+        self.keys = sorted((-v, uid) for uid, v in self.value.items())
+
+    def update(self, uid: int, new: int) -> None:
+        old = self.value.get(uid)
+        if old:
+            i = bisect.bisect_left(self.keys, (-old, uid))
+            del self.keys[i]
+        if new:
+            bisect.insort(self.keys, (-new, uid))
+            self.value[uid] = new
+        else:
+            self.value.pop(uid, None)
+
+    def top(self, n: int) -> List[Tuple[int, int]]:
+        return [(uid, -neg) for neg, uid in self.keys[:n]]
+
+
+STATS: Dict[int, Dict[int, PlayerStats]] = {}         # scope (0 = global, else chat_id) -> user_id -> stats
+LEADERBOARDS: Dict[Tuple[int, str], LeaderIndex] = {}  # built on first query, then maintained
+STATS_LOAD_FAILED = False  # set when the snapshot was unreadable; blocks compaction
+STATS_LOG_GEN = 0          # generation of the current log; the snapshot records the last one it folded in
+
+def count_action(game: Game, role: str, metric: str) -> None:
+    for p in game.players.values():
+        if p.role == role:
+            tally = game.actions.setdefault(p.user_id, {})
+            tally[metric] = tally.get(metric, 0) + 1
+
+def apply_stats_delta(chat_id: int, rows: Dict[int, dict]) -> None:
+    for scope in (0, chat_id):
+        table = STATS.setdefault(scope, {})
+        for uid, row in rows.items():
+            st = table.get(uid)
+            if st is None:
+                st = table[uid] = PlayerStats()
+            st.name = row.get("name", st.name)
+            for m in STAT_METRICS:
+                inc = row.get(m, 0)
+                if not inc:
+                    continue
+                setattr(st, m, getattr(st, m) + inc)
+                idx = LEADERBOARDS.get((scope, m))
+                if idx is not None:
+                    idx.update(uid, getattr(st, m))
+            if row.get("wins"):
+                st.wins_by_role[row["role"]] = st.wins_by_role.get(row["role"], 0) + 1
+
+def record_game_end(game: Game, killer_won: bool) -> None:
+    rows: Dict[int, dict] = {}
+    for p in game.players.values():
+        won = (p.role == "killer") == killer_won
+        row = {"name": p.name, "role": p.role, "games": 1, "wins": 1 if won else 0}
+        row.update(game.actions.get(p.user_id, {}))
+        rows[p.user_id] = row
+    game.actions = {}
+    apply_stats_delta(game.chat_id, rows)
+    try:
+        with FILE_LOCK:
+            if not os.path.exists(STATS_LOG) or os.path.getsize(STATS_LOG) == 0:
+                start_stats_log(STATS_LOG_GEN)
+            with open(STATS_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"chat_id": game.chat_id, "rows": {str(k): v for k, v in rows.items()}}, ensure_ascii=False) + "\n")
+    except Exception:
+        logger.exception("Failed to append stats for chat %s", game.chat_id)
+
+def save_stats() -> None:
+    # Compact: write the full snapshot and start a fresh log
+    if STATS_LOAD_FAILED:
+        logger.error("Stats were not loaded cleanly; not compacting over %s / %s", STATS_FILE, STATS_LOG)
+        return
+    with FILE_LOCK:
+        obj = {str(scope): {str(uid): asdict(st) for uid, st in table.items()} for scope, table in STATS.items()}
+        # The snapshot replaces the old one atomically and names the log generation it
+        # includes; a crash before the log is restarted is then detected on load instead
+        # of replaying (double-counting) that log again.
+        obj["_log_gen"] = STATS_LOG_GEN
+        tmp = STATS_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, STATS_FILE)
+        start_stats_log(STATS_LOG_GEN + 1)
+
+def start_stats_log(gen: int) -> None:
+    global STATS_LOG_GEN
+    STATS_LOG_GEN = gen
+    with open(STATS_LOG, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"gen": gen}) + "\n")
+
+def load_stats() -> None:
+    global STATS, STATS_LOAD_FAILED, STATS_LOG_GEN
+    STATS = {}
+    STATS_LOAD_FAILED = False
+    LEADERBOARDS.clear()
+    folded = -1  # last log generation already in the snapshot
+    if os.path.exists(STATS_FILE):
+        try:
+            with open(STATS_FILE, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            folded = int(raw.pop("_log_gen", -1))
+            STATS = {
+                int(scope): {int(uid): PlayerStats(**st) for uid, st in table.items()}
+                for scope, table in raw.items()
+            }
+        except Exception:
+            # Keep the bad snapshot for recovery and never compact over it in this run
+            aside = f"{STATS_FILE}.corrupt-{int(time.time())}"
+            logger.exception("Failed to load stats snapshot; moved it to %s", aside)
+            os.replace(STATS_FILE, aside)
+            STATS = {}
+            STATS_LOAD_FAILED = True
+            folded = -1
+    STATS_LOG_GEN = folded + 1
+
+    replayed = 0
+    rejected: List[str] = []
+    already_folded = False
+    if os.path.exists(STATS_LOG):
+        with open(STATS_LOG, "r", encoding="utf-8") as f:
+            for lineno, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                if lineno == 1:
+                    # generation header; a log from before generations existed counts as 0
+                    try:
+                        gen, header = int(json.loads(line)["gen"]), True
+                    except (ValueError, KeyError, TypeError):
+                        gen, header = 0, False
+                    if gen <= folded:
+                        # crashed after the snapshot was replaced but before the log restarted
+                        logger.warning("Stats log generation %d is already in the snapshot; not replaying it", gen)
+                        already_folded = True
+                        break
+                    if header:
+                        STATS_LOG_GEN = gen
+                        continue
+                try:
+                    entry = json.loads(line)
+                    chat_id = int(entry["chat_id"])
+                    rows = {int(k): dict(v) for k, v in entry["rows"].items()}
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    # typically a torn last line from a crash mid-append
+                    logger.warning("Skipping unreadable stats log line %d", lineno)
+                    rejected.append(line if line.endswith("\n") else line + "\n")
+                    continue
+                apply_stats_delta(chat_id, rows)
+                replayed += 1
+    if rejected:
+        with open(STATS_LOG + ".rejected", "a", encoding="utf-8") as f:
+            f.writelines(rejected)
+    if replayed or rejected or already_folded:
+        save_stats()
+
+def leaderboard(scope: int, metric: str, n: int) -> List[Tuple[PlayerStats, int]]:
+    idx = LEADERBOARDS.get((scope, metric))
+    table = STATS.get(scope, {})
+    if idx is None:
+        idx = LEADERBOARDS[(scope, metric)] = LeaderIndex({uid: getattr(st, metric) for uid, st in table.items()})
+    return [(table[uid], v) for uid, v in idx.top(n)]
+
+# -------------------- Phase tracing --------------------
+TRACES: Dict[int, Deque[dict]] = {}               # chat_id -> recent events (ring buffer)
+TRACE_OPEN: Dict[int, Tuple[str, int, dict]] = {}  # chat_id -> (phase, start_us, args) of the running phase
+TRACE_TIDS = {"phase": 1, "send": 2, "action": 3}
+
+def _now_us() -> int:
+    return int(time.time() * 1_000_000)
+
+def trace_event(chat_id: int, name: str, cat: str, ts: Optional[int] = None, dur: Optional[int] = None, **args) -> None:
+    buf = TRACES.get(chat_id)
+    if buf is None:
+        buf = TRACES[chat_id] = deque(maxlen=TRACE_EVENTS)
+    ev = {"name": name, "cat": cat, "ph": "X" if dur is not None else "i", "ts": ts or _now_us()}
+    if dur is not None:
+        ev["dur"] = dur
+    if args:
+        ev["args"] = args
+    buf.append(ev)
+
+def trace_phase(game: Game, phase: str, **args) -> None:
+    # Closes the running phase span and opens the next one ("lobby" just closes)
+    now = _now_us()
+    cur = TRACE_OPEN.pop(game.chat_id, None)
+    if cur:
+        trace_event(game.chat_id, cur[0], "phase", ts=cur[1], dur=now - cur[1], **cur[2])
+    if phase != "lobby":
+        TRACE_OPEN[game.chat_id] = (phase, now, args)
+
+def trace_action(game: Game, name: str, **args) -> None:
+    trace_event(game.chat_id, name, "action", night=game.night, **args)
+
+async def send_traced(bot, game: Game, label: str, **kwargs):
+    t0 = _now_us()
+    try:
+        return await bot.send_message(**kwargs)
+    finally:
+        trace_event(game.chat_id, f"send:{label}", "send", ts=t0, dur=_now_us() - t0)
+
+def export_trace(chat_id: int, fmt: str = "json") -> dict:
+    events = list(TRACES.get(chat_id, ()))
+    cur = TRACE_OPEN.get(chat_id)
+    if cur:
+        # still-running phase, so stalls show up with their duration so far
+        now = _now_us()
+        events.append({"name": cur[0], "cat": "phase", "ph": "X", "ts": cur[1], "dur": now - cur[1], "args": {**cur[2], "open": True}})
+    if fmt != "chrome":
+        return {"chat_id": chat_id, "events": events}
+    out = [{"name": "process_name", "ph": "M", "pid": chat_id, "tid": 0, "args": {"name": f"game {chat_id}"}}]
+    for cat, tid in TRACE_TIDS.items():
+        out.append({"name": "thread_name", "ph": "M", "pid": chat_id, "tid": tid, "args": {"name": cat}})
+    for ev in events:
+        ev = dict(ev, pid=chat_id, tid=TRACE_TIDS.get(ev["cat"], 0))
+        if ev["ph"] == "i":
+            ev["s"] = "t"
+        out.append(ev)
+    return {"traceEvents": out, "displayTimeUnit": "ms"}
+
+# -------------------- Callback de-dup & flood control --------------------
+CB_SEEN: "OrderedDict[Tuple, list]" = OrderedDict()  # (user, chat, message) -> [ts, data, text, show_alert] of the last tap
+BUCKETS: Dict[Tuple[str, int], List[float]] = {}     # ("u"|"c", id) -> [tokens, last_ts]
+CB_STATS = {"duplicates": 0, "throttled_user": 0, "throttled_chat": 0}
+
+def cb_key(query) -> Tuple:
+    msg = query.message
+    if msg:
+        return (query.from_user.id, msg.chat_id, msg.message_id)
+    return (query.from_user.id, None, query.inline_message_id)
+
+def cb_chat_id(query) -> Optional[int]:
+    # Game chat for g:vp / dm:* taps (DM taps happen in private chats), else the message chat
+    parts = (query.data or "").split(":")
+    if len(parts) >= 3 and parts[0] in ("g", "dm"):
+        try:
+            return int(parts[2])
+        except ValueError:
+            pass
+    return query.message.chat_id if query.message else None
+
+def take_token(key: Tuple[str, int], burst: int, rate: float, now: float) -> bool:
+    b = BUCKETS.get(key)
+    if b is None:
+        if len(BUCKETS) > 10000:
+            # drop buckets that have refilled completely; they carry no state
+            for k in [k for k, v in BUCKETS.items() if now - v[1] >= burst / rate]:
+                del BUCKETS[k]
+        b = BUCKETS[key] = [float(burst), now]
+    tokens = min(float(burst), b[0] + (now - b[1]) * rate)
+    b[1] = now
+    if tokens < 1.0:
+        b[0] = tokens
+        return False
+    b[0] = tokens - 1.0
+    return True
+
+def remember_tap(key: Tuple, data: Optional[str], now: float) -> None:
+    # Replaces the user's previous tap on this message and keeps CB_SEEN ordered by time for pruning
+    CB_SEEN.pop(key, None)
+    CB_SEEN[key] = [now, data, None, False]
+
+async def answer_cb(query, text: Optional[str] = None, show_alert: bool = False) -> None:
+    # Remember the answer so duplicate taps get the same reply without re-running the handler
+    e = CB_SEEN.get(cb_key(query))
+    if e is not None and e[1] == query.data:
+        e[2] = text
+        e[3] = show_alert
+    try:
+        await query.answer(text, show_alert=show_alert)
+    except BadRequest:
+        # Queries older than ~15s can't be answered (e.g. replayed after downtime); the action still applies
+        logger.debug("Could not answer callback %s", query.data)
+
+async def guard_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    now = time.monotonic()
+    while CB_SEEN:
+        oldest = next(iter(CB_SEEN.values()))
+        if now - oldest[0] < CB_DEDUP_WINDOW:
+            break
+        CB_SEEN.popitem(last=False)
+
+    # Only a repeat of the user's *last* tap on this message is a duplicate;
+    # tapping A, B, A must run the handler again for the second A.
+    # g:lang steps to the next language on every tap, so a repeat is never a duplicate.
+    key = cb_key(query)
+    seen = CB_SEEN.get(key)
+    if seen is not None and seen[1] == query.data and query.data != CB_G_LANG:
+        CB_STATS["duplicates"] += 1
+        try:
+            await query.answer(seen[2], show_alert=seen[3])
+        except Exception:
+            pass
+        raise ApplicationHandlerStop
+
+    if CATCHING_UP:
+        # The backlog was already collapsed; its timestamps say nothing about flooding
+        remember_tap(key, query.data, now)
+        return
+
+    # Throttled taps are dropped without an answer; that would be another API call
+    if not take_token(("u", query.from_user.id), USER_BURST, USER_RATE, now):
+        CB_STATS["throttled_user"] += 1
+        raise ApplicationHandlerStop
+    chat_id = cb_chat_id(query)
+    if chat_id is not None and not take_token(("c", chat_id), CHAT_BURST, CHAT_RATE, now):
+        CB_STATS["throttled_chat"] += 1
+        raise ApplicationHandlerStop
+
+    remember_tap(key, query.data, now)
+
 # -------------------- Helpers --------------------
 def is_group(chat: Chat) -> bool:
     return chat.type in (Chat.GROUP, Chat.SUPERGROUP)
@@ -401,19 +940,70 @@ def majority_needed(game: Game) -> int:
     alive_count = sum(1 for p in game.players.values() if p.alive)
     return (alive_count // 2) + 1
 
+def tally_votes(game: Game) -> Dict[int, int]:
+    counts: Dict[int, int] = {}
+    for voter_id, target_id in (game.votes or {}).items():
+        voter = game.players.get(voter_id)
+        if voter and voter.alive:
+            counts[target_id] = counts.get(target_id, 0) + 1
+    return counts
+
+def game_phase(game: Optional[Game]) -> str:
+    if not game or not game.started:
+        return "lobby"
+    return "vote" if game.voting_open else "night"
+
 # -------------------- Game Flow --------------------
+async def notify_dm_cant(bot, game: Game, p: Player) -> None:
+    # One group notice per player per game is enough
+    if p.user_id in game.dm_warned:
+        game.api_calls_saved += 1
+        return
+    game.dm_warned.append(p.user_id)
+    await send_traced(bot, game, "dm_cant", chat_id=game.chat_id, text=tr(game, "dm_cant", name=p.name))
+
+async def send_role_dm(bot, game: Game, p: Player) -> None:
+    prompt = f"dm:{p.user_id}"
+    if dm_reachable(p.user_id) is False:
+        game.api_calls_saved += 1
+        game.prompts.append(prompt)
+        await notify_dm_cant(bot, game, p)
+        return
+    role = p.role
+    title = tr(game, "role_title", icon=ROLE_ICONS[role], role=role_name(game, role))
+    desc = role_desc(game, role)
+    extra = f"\n\n{tr(game, 'keep_secret')}" if role in ("killer", "doctor", "detective") else ""
+    text = f"{title}\n{desc}{extra}"
+    kb = role_dm_menu(game, role)
+    try:
+        await send_traced(bot, game, "role_dm", chat_id=p.user_id, text=text, reply_markup=kb, parse_mode=ParseMode.HTML)
+        mark_dm(p.user_id, True)
+        game.prompts.append(prompt)
+    except Forbidden:
+        mark_dm(p.user_id, False)
+        game.prompts.append(prompt)
+        await notify_dm_cant(bot, game, p)
+    except Exception:
+        await notify_dm_cant(bot, game, p)
+
 async def send_role_dms(context: ContextTypes.DEFAULT_TYPE, game: Game) -> None:
     for p in game.players.values():
-        role = p.role
-        title = tr(game, "role_title", icon=ROLE_ICONS[role], role=role_name(game, role))
-        desc = role_desc(game, role)
-        extra = f"\n\n{tr(game, 'keep_secret')}" if role in ("killer", "doctor", "detective") else ""
-        text = f"{title}\n{desc}{extra}"
-        kb = role_dm_menu(game, role)
-        try:
-            await context.bot.send_message(chat_id=p.user_id, text=text, reply_markup=kb, parse_mode=ParseMode.HTML)
-        except Exception:
-            await context.bot.send_message(chat_id=game.chat_id, text=tr(game, "dm_cant", name=p.name))
+        await send_role_dm(context.bot, game, p)
+    save_games()
+    flush_dm_cache()
+
+async def send_phase_prompt(bot, game: Game, prompt: str) -> None:
+    if prompt == "night":
+        await send_traced(bot, game, "night_begins", chat_id=game.chat_id, text=tr(game, "night_begins", n=game.night))
+    elif prompt == "vote":
+        msg = await send_traced(bot, game, "vote_started", chat_id=game.chat_id, text=tr(game, "vote_started"), reply_markup=vote_keyboard(game))
+        game.vote_msg_id = msg.message_id if msg else None
+    else:
+        p = game.players.get(int(prompt.split(":", 1)[1]))
+        if p:
+            await send_role_dm(bot, game, p)
+        return
+    game.prompts.append(prompt)
 
 async def start_night(context: ContextTypes.DEFAULT_TYPE, game: Game) -> None:
     game.voting_open = False
@@ -421,15 +1011,20 @@ async def start_night(context: ContextTypes.DEFAULT_TYPE, game: Game) -> None:
     game.pending_kill_target = None
     game.pending_save_target = None
     game.pending_investigation_target = None
+    game.prompts = []
     save_games()
-    await context.bot.send_message(chat_id=game.chat_id, text=tr(game, "night_begins", n=game.night))
+    trace_phase(game, "night", n=game.night)
+    await send_phase_prompt(context.bot, game, "night")
     await send_role_dms(context, game)
 
 async def start_vote(context: ContextTypes.DEFAULT_TYPE, game: Game) -> None:
     game.voting_open = True
     game.votes = {}
+    game.prompts = []
+    save_games()
+    trace_phase(game, "vote", n=game.night)
+    await send_phase_prompt(context.bot, game, "vote")
     save_games()
-    await context.bot.send_message(chat_id=game.chat_id, text=tr(game, "vote_started"), reply_markup=vote_keyboard(game))
 
 async def check_win_and_announce(context: ContextTypes.DEFAULT_TYPE, game: Game) -> bool:
     alive = [p for p in game.players.values() if p.alive]
@@ -438,14 +1033,22 @@ async def check_win_and_announce(context: ContextTypes.DEFAULT_TYPE, game: Game)
     if not killers:
         game.started = False
         game.voting_open = False
+        record_game_end(game, killer_won=False)
+        trace_phase(game, "lobby")
+        trace_action(game, "game_over", winner="players")
         save_games()
-        await context.bot.send_message(chat_id=game.chat_id, text=tr(game, "players_win"))
+        logger.info("Game %s over: %s API calls avoided by DM cache", game.chat_id, game.api_calls_saved)
+        await send_traced(context.bot, game, "players_win", chat_id=game.chat_id, text=tr(game, "players_win"))
         return True
     if len(killers) >= len(others):
         game.started = False
         game.voting_open = False
+        record_game_end(game, killer_won=True)
+        trace_phase(game, "lobby")
+        trace_action(game, "game_over", winner="killer")
         save_games()
-        await context.bot.send_message(chat_id=game.chat_id, text=tr(game, "killer_win"))
+        logger.info("Game %s over: %s API calls avoided by DM cache", game.chat_id, game.api_calls_saved)
+        await send_traced(context.bot, game, "killer_win", chat_id=game.chat_id, text=tr(game, "killer_win"))
         return True
     return False
 
@@ -457,20 +1060,23 @@ async def resolve_night_if_ready(context: ContextTypes.DEFAULT_TYPE, game: Game)
 
     victim_id = game.pending_kill_target
     saved_id = game.pending_save_target
+    trace_phase(game, "night_resolve", n=game.night)
 
     game.pending_kill_target = None
     game.pending_save_target = None
     game.pending_investigation_target = None
 
     if victim_id == saved_id:
-        await context.bot.send_message(chat_id=game.chat_id, text=tr(game, "night_over_saved", n=game.night))
+        count_action(game, "doctor", "saves")
+        await send_traced(context.bot, game, "night_over_saved", chat_id=game.chat_id, text=tr(game, "night_over_saved", n=game.night))
     else:
         victim = game.players.get(victim_id)
         if victim and victim.alive:
             victim.alive = False
-            await context.bot.send_message(chat_id=game.chat_id, text=tr(game, "night_over_killed", n=game.night, name=victim.name))
+            count_action(game, "killer", "kills")
+            await send_traced(context.bot, game, "night_over_killed", chat_id=game.chat_id, text=tr(game, "night_over_killed", n=game.night, name=victim.name))
         else:
-            await context.bot.send_message(chat_id=game.chat_id, text=tr(game, "night_over_invalid", n=game.night))
+            await send_traced(context.bot, game, "night_over_invalid", chat_id=game.chat_id, text=tr(game, "night_over_invalid", n=game.night))
 
     save_games()
     if await check_win_and_announce(context, game):
@@ -483,23 +1089,19 @@ async def apply_vote_if_majority(context: ContextTypes.DEFAULT_TYPE, game: Game)
     if not game.started or not game.voting_open:
         return
 
-    counts: Dict[int, int] = {}
-    for voter_id, target_id in (game.votes or {}).items():
-        voter = game.players.get(voter_id)
-        if voter and voter.alive:
-            counts[target_id] = counts.get(target_id, 0) + 1
-
+    counts = tally_votes(game)
     needed = majority_needed(game)
     for target_id, cnt in counts.items():
         if cnt >= needed:
             target = game.players.get(target_id)
             if target and target.alive:
+                trace_phase(game, "vote_resolve", n=game.night, votes=cnt, needed=needed)
                 target.alive = False
                 game.voting_open = False
                 game.votes = {}
                 save_games()
 
-                await context.bot.send_message(chat_id=game.chat_id, text=tr(game, "vote_result", name=target.name, cnt=cnt, need=needed))
+                await send_traced(context.bot, game, "vote_result", chat_id=game.chat_id, text=tr(game, "vote_result", name=target.name, cnt=cnt, need=needed))
 
                 if await check_win_and_announce(context, game):
                     return
@@ -509,12 +1111,226 @@ async def apply_vote_if_majority(context: ContextTypes.DEFAULT_TYPE, game: Game)
                 await start_night(context, game)
             return
 
+# -------------------- Restart: resume & drain --------------------
+class RateLimiter:
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.get_running_loop().create_task(coro)
+    OUTBOUND.add(task)
+    task.add_done_callback(OUTBOUND.discard)
+    return task
+
+def missing_prompts(game: Game) -> List[str]:
+    if not game.started:
+        return []
+    done = set(game.prompts or [])
+    if game.voting_open:
+        return [] if "vote" in done else ["vote"]
+    missing = [] if "night" in done else ["night"]
+    acted = {
+        "killer": game.pending_kill_target is not None,
+        "doctor": game.pending_save_target is not None,
+        "detective": game.pending_investigation_target is not None,
+    }
+    for p in game.players.values():
+        if f"dm:{p.user_id}" in done or acted.get(p.role):
+            continue
+        missing.append(f"dm:{p.user_id}")
+    return missing
+
+async def resume_games(bot) -> None:
+    t0 = time.monotonic()
+    sem = asyncio.Semaphore(RESUME_CONCURRENCY)
+    limiter = RateLimiter(RESUME_RATE)
+    sent = skipped = 0
+
+    async def run(game: Game, prompt: str, phase: str, night: int) -> None:
+        nonlocal sent, skipped
+        log_context(chat_id=game.chat_id, handler="resume", phase=phase)
+        async with sem:
+            if DRAINING:
+                return
+            await limiter.wait()
+            # Live handlers may have moved the game on while this job waited for a slot
+            if (
+                GAMES.get(game.chat_id) is not game or game_phase(game) != phase
+                or game.night != night or prompt not in missing_prompts(game)
+            ):
+                skipped += 1
+                return
+            try:
+                await send_phase_prompt(bot, game, prompt)
+                sent += 1
+            except Exception:
+                logger.warning("Resume: failed to post %s for chat %s", prompt, game.chat_id, exc_info=True)
+
+    jobs = [(g, pr, game_phase(g), g.night) for g in list(GAMES.values()) for pr in missing_prompts(g)]
+    scan_s = time.monotonic() - t0
+    if jobs:
+        await asyncio.gather(*(run(*job) for job in jobs))
+        save_games()
+        flush_dm_cache()
+    logger.info(
+        "Resume: %d games, %d missing prompts (scan %.3fs), %d re-posted, %d skipped as outdated in %.2fs; finished %.2fs after boot",
+        len(GAMES), len(jobs), scan_s, sent, skipped, time.monotonic() - t0, time.monotonic() - BOOT_T0,
+    )
+
+# -------------------- Startup backlog catch-up --------------------
+CATCHING_UP = False
+
+def collapse_backlog(updates: List[Update]) -> Tuple[List[Update], Dict[str, int]]:
+    # Walk newest-first and keep only what still matters:
+    # - latest vote per (game, voter), only on the current vote keyboard of an open vote
+    # - latest night pick / menu per (game, actor, action), only while that game is in its night
+    # - one copy of identical group-button taps on the same message (except the language cycle)
+    dropped = {"stale": 0, "superseded": 0}
+    seen: Set[Tuple] = set()
+    kept: List[Update] = []
+    for u in reversed(updates):
+        q = u.callback_query
+        if not q:
+            kept.append(u)
+            continue
+        parts = (q.data or "").split(":")
+        msg_id = q.message.message_id if q.message else None
+        key: Optional[Tuple] = None
+        stale = parts[0] == "noop"
+        if len(parts) == 4 and parts[:2] == ["g", "vp"]:
+            game = GAMES.get(int(parts[2])) if parts[2].lstrip("-").isdigit() else None
+            stale = (
+                not game or not game.started or not game.voting_open
+                or (game.vote_msg_id is not None and msg_id != game.vote_msg_id)
+            )
+            key = ("vp", parts[2], q.from_user.id)
+        elif parts[0] == "dm" and len(parts) >= 3:
+            game = GAMES.get(int(parts[2])) if parts[2].lstrip("-").isdigit() else None
+            stale = not game or not game.started or game.voting_open
+            key = ("dm", parts[1], parts[2], q.from_user.id)
+        elif parts[0] == "g" and q.data != CB_G_LANG:
+            # g:lang is not idempotent (each tap steps to the next language), so every tap is kept
+            key = ("g", q.data, q.from_user.id, msg_id)
+        if stale:
+            dropped["stale"] += 1
+            continue
+        if key is not None:
+            if key in seen:
+                dropped["superseded"] += 1
+                continue
+            seen.add(key)
+        kept.append(u)
+    kept.reverse()
+    return kept, dropped
+
+async def catch_up(app) -> None:
+    global CATCHING_UP
+    t0 = time.monotonic()
+    updates: List[Update] = []
+    offset = None
+    # Fetching the next batch confirms the previous one to Telegram, so whatever is
+    # in `updates` must be processed below even if a later fetch fails
+    try:
+        while True:
+            batch = await app.bot.get_updates(offset=offset, limit=CATCHUP_BATCH, timeout=0, allowed_updates=ALLOWED_UPDATES)
+            if not batch:
+                break
+            updates.extend(batch)
+            offset = batch[-1].update_id + 1
+            if len(batch) < CATCHUP_BATCH:
+                break
+    except Exception:
+        logger.warning(
+            "Catch-up: fetch failed after %d updates; processing those, unfetched ones will be polled normally",
+            len(updates), exc_info=True,
+        )
+    fetch_s = time.monotonic() - t0
+    if not updates:
+        logger.info("Catch-up: no pending updates (%.2fs)", fetch_s)
+        return
+
+    try:
+        kept, dropped = collapse_backlog(updates)
+    except Exception:
+        logger.exception("Catch-up: collapsing failed; processing the backlog as fetched")
+        kept, dropped = updates, {"stale": 0, "superseded": 0}
+    CATCHING_UP = True
+    try:
+        for u in kept:
+            await app.process_update(u)
+    finally:
+        CATCHING_UP = False
+        # bind_log_context tagged this task with the last backlog update; later lines
+        # (and the resume task spawned from here) must not inherit it
+        LOG_CTX.set({})
+
+    # Confirm up to the last processed update (also after a failed fetch) so polling
+    # starts after the backlog instead of delivering it a second time
+    try:
+        await app.bot.get_updates(offset=offset, limit=1, timeout=0, allowed_updates=ALLOWED_UPDATES)
+    except Exception:
+        logger.warning("Catch-up: could not confirm the last batch; up to %d updates may be delivered again", CATCHUP_BATCH, exc_info=True)
+    logger.info(
+        "Catch-up: fetched %d updates in %.2fs, dropped %d stale / %d superseded, processed %d; done in %.2fs",
+        len(updates), fetch_s, dropped["stale"], dropped["superseded"], len(kept), time.monotonic() - t0,
+    )
+
+async def on_post_init(app) -> None:
+    if STARTUP_BACKLOG == "catchup":
+        try:
+            await catch_up(app)
+        except Exception:
+            logger.exception("Catch-up aborted while processing the backlog; unprocessed fetched updates are lost")
+    # Polling starts right away; prompts are re-posted in the background at RESUME_RATE
+    spawn(resume_games(app.bot))
+    logger.info("Ready: polling starts %.2fs after boot", time.monotonic() - BOOT_T0)
+
+async def on_post_stop(app) -> None:
+    # Updater and handlers are already stopped by now; drain our own sends, then flush
+    global DRAINING
+    DRAINING = True
+    pending = [t for t in OUTBOUND if not t.done()]
+    if pending:
+        _, not_done = await asyncio.wait(pending, timeout=DRAIN_TIMEOUT)
+        for t in not_done:
+            t.cancel()
+        logger.info("Shutdown: drained %d outbound tasks (%d cancelled)", len(pending) - len(not_done), len(not_done))
+    save_games()
+    save_dm_cache()
+    save_stats()
+    logger.info("Shutdown: state flushed (%d games); suppressed callbacks: %s", len(GAMES), CB_STATS)
+
 # -------------------- Commands --------------------
+async def bind_log_context(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Runs first for every update so all records it produces carry chat/user/handler/phase
+    chat_id = update.effective_chat.id if update.effective_chat else None
+    user_id = update.effective_user.id if update.effective_user else None
+    handler = None
+    if update.callback_query:
+        handler = ":".join((update.callback_query.data or "").split(":")[:2]) or None
+        chat_id = cb_chat_id(update.callback_query) or chat_id
+    elif update.message and update.message.text and update.message.text.startswith("/"):
+        handler = update.message.text.split()[0].split("@")[0]
+    log_context(chat_id=chat_id, user_id=user_id, handler=handler, phase=game_phase(GAMES.get(chat_id)))
+
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat = update.effective_chat
     if not chat or not is_group(chat):
         # Private chat
-        await update.message.reply_text(TEXT_AR["add_to_group"] + "\n\n---\n\n" + TEXT_EN["add_to_group"])
+        if update.effective_user:
+            mark_dm(update.effective_user.id, True)
+            flush_dm_cache()
+        await update.message.reply_text(tr_all("add_to_group", "\n\n---\n\n"))
         return
 
     game = get_or_create_game(chat.id)
@@ -531,7 +1347,7 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat = update.effective_chat
     if not chat or not is_group(chat):
-        await update.message.reply_text(TEXT_AR["use_in_group"] + "\n" + TEXT_EN["use_in_group"])
+        await update.message.reply_text(tr_all("use_in_group"))
         return
 
     game = GAMES.get(chat.id)
@@ -540,17 +1356,70 @@ async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         return
 
     await update.message.reply_text(
-        f"{'RUNNING' if game.started else 'NOT STARTED'} | Night: {game.night} | Voting: {'OPEN' if game.voting_open else 'CLOSED'}\n\n"
+        f"{'RUNNING' if game.started else 'NOT STARTED'} | Night: {game.night} | Voting: {'OPEN' if game.voting_open else 'CLOSED'}"
+        f" | DM calls saved: {game.api_calls_saved}\n"
+        f"Suppressed taps (bot-wide): {CB_STATS['duplicates']} dup, {CB_STATS['throttled_user']} user, {CB_STATS['throttled_chat']} chat\n\n"
         + format_players(game)
     )
 
+async def cmd_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    chat = update.effective_chat
+    in_group = bool(chat and is_group(chat))
+    game = GAMES.get(chat.id) if in_group else None
+
+    metric, n = "wins", LEADERBOARD_SIZE
+    for arg in context.args or []:
+        if arg in STAT_METRICS:
+            metric = arg
+        elif arg.isdigit():
+            n = max(1, min(int(arg), LEADERBOARD_MAX))
+        else:
+            await update.message.reply_text(tr(game, "lb_usage"))
+            return
+
+    rows = leaderboard(chat.id if in_group else 0, metric, n)
+    if not rows:
+        await update.message.reply_text(tr(game, "lb_empty"))
+        return
+    title = tr(game, "lb_title" if in_group else "lb_title_global", metric=tr(game, f"metric_{metric}"))
+    lines = [f"{i}. {st.name} — {v}" for i, (st, v) in enumerate(rows, 1)]
+    await update.message.reply_text(title + "\n" + "\n".join(lines))
+
+async def cmd_trace(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    chat = update.effective_chat
+    if not chat or not is_group(chat):
+        await update.message.reply_text(tr_all("use_in_group"))
+        return
+
+    game = GAMES.get(chat.id)
+    try:
+        member = await chat.get_member(update.effective_user.id)
+        admin = member.status in ("administrator", "creator")
+    except Exception:
+        admin = False
+    if not admin:
+        await update.message.reply_text(tr(game, "admins_only"))
+        return
+
+    fmt = "chrome" if "chrome" in (context.args or []) else "json"
+    data = json.dumps(export_trace(chat.id, fmt), ensure_ascii=False, indent=1).encode("utf-8")
+    name = f"trace_{chat.id}{'.chrome' if fmt == 'chrome' else ''}.json"
+    # Sent privately: the timeline is for the admin, not for the players in the group
+    try:
+        await context.bot.send_document(chat_id=update.effective_user.id, document=InputFile(io.BytesIO(data), filename=name))
+    except Forbidden:
+        mark_dm(update.effective_user.id, False)
+        await update.message.reply_text(tr(game, "trace_dm_failed"))
+        return
+    await update.message.reply_text(tr(game, "trace_sent_dm"))
+
 async def cmd_unknown(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat = update.effective_chat
     if chat and is_group(chat) and chat.id in GAMES:
         game = GAMES[chat.id]
         await update.message.reply_text(tr(game, "unknown_cmd"))
     else:
-        await update.message.reply_text(TEXT_AR["unknown_cmd"] + "\n" + TEXT_EN["unknown_cmd"])
+        await update.message.reply_text(tr_all("unknown_cmd"))
 
 # -------------------- Callbacks --------------------
 async def on_group_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -560,7 +1429,7 @@ async def on_group_button(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user = query.from_user
 
     if not is_group(chat):
-        await query.answer("—", show_alert=True)
+        await answer_cb(query, "—", show_alert=True)
         return
 
     game = get_or_create_game(chat.id)
@@ -574,37 +1443,40 @@ async def on_group_button(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     if data == CB_G_JOIN:
         if user.id in game.players:
-            await query.answer(tr(game, "already_joined"), show_alert=True)
+            await answer_cb(query, tr(game, "already_joined"), show_alert=True)
             return
         game.players[user.id] = Player(user_id=user.id, name=user.full_name, username=user.username, alive=True)
         save_games()
-        await query.answer(tr(game, "joined"), show_alert=True)
+        if dm_reachable(user.id) is False:
+            await answer_cb(query, tr(game, "joined_dm_warn"), show_alert=True)
+        else:
+            await answer_cb(query, tr(game, "joined"), show_alert=True)
 
     elif data == CB_G_LEAVE:
         if user.id not in game.players:
-            await query.answer(tr(game, "not_joined"), show_alert=True)
+            await answer_cb(query, tr(game, "not_joined"), show_alert=True)
             return
         del game.players[user.id]
         save_games()
-        await query.answer(tr(game, "left"), show_alert=True)
+        await answer_cb(query, tr(game, "left"), show_alert=True)
 
     elif data == CB_G_LANG:
         if not admin:
-            await query.answer(tr(game, "admins_only"), show_alert=True)
+            await answer_cb(query, tr(game, "admins_only"), show_alert=True)
             return
-        game.lang = "ar" if game.lang == "en" else "en"
+        game.lang = next_lang(game.lang)
         save_games()
-        await query.answer(tr(game, "lang_switched"), show_alert=True)
+        await answer_cb(query, tr(game, "lang_switched"), show_alert=True)
 
     elif data == CB_G_START:
         if not admin:
-            await query.answer(tr(game, "admins_only"), show_alert=True)
+            await answer_cb(query, tr(game, "admins_only"), show_alert=True)
             return
         if game.started:
-            await query.answer(tr(game, "game_already_started"), show_alert=True)
+            await answer_cb(query, tr(game, "game_already_started"), show_alert=True)
             return
         if len(game.players) < MIN_PLAYERS:
-            await query.answer(tr(game, "need_players"), show_alert=True)
+            await answer_cb(query, tr(game, "need_players"), show_alert=True)
             return
 
         for p in game.players.values():
@@ -624,32 +1496,37 @@ async def on_group_button(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         game.pending_kill_target = None
         game.pending_save_target = None
         game.pending_investigation_target = None
+        game.dm_warned = []
+        game.api_calls_saved = 0
+        game.prompts = []
+        game.actions = {}
         save_games()
+        trace_action(game, "game_start", players=len(game.players))
 
-        await context.bot.send_message(chat_id=chat.id, text=tr(game, "game_started"))
+        await send_traced(context.bot, game, "game_started", chat_id=chat.id, text=tr(game, "game_started"))
         await start_night(context, game)
-        await query.answer("✅", show_alert=False)
+        await answer_cb(query, "✅", show_alert=False)
 
     elif data == CB_G_PLAYERS:
         if not admin:
-            await query.answer(tr(game, "admins_only"), show_alert=True)
+            await answer_cb(query, tr(game, "admins_only"), show_alert=True)
             return
         short = format_players(game, limit=180)
-        await query.answer(f"{tr(game,'players_popup_title')}\n{short}", show_alert=True)
+        await answer_cb(query, f"{tr(game,'players_popup_title')}\n{short}", show_alert=True)
 
     elif data == CB_G_FORCE_VOTE:
         if not admin:
-            await query.answer(tr(game, "admins_only"), show_alert=True)
+            await answer_cb(query, tr(game, "admins_only"), show_alert=True)
             return
         if not game.started:
-            await query.answer(tr(game, "start_first"), show_alert=True)
+            await answer_cb(query, tr(game, "start_first"), show_alert=True)
             return
-        await query.answer(tr(game, "vote_started_ok"), show_alert=True)
+        await answer_cb(query, tr(game, "vote_started_ok"), show_alert=True)
         await start_vote(context, game)
 
     elif data == CB_G_END:
         if not admin:
-            await query.answer(tr(game, "admins_only"), show_alert=True)
+            await answer_cb(query, tr(game, "admins_only"), show_alert=True)
             return
         game.started = False
         game.night = 0
@@ -658,12 +1535,16 @@ async def on_group_button(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         game.pending_kill_target = None
         game.pending_save_target = None
         game.pending_investigation_target = None
+        game.prompts = []
+        game.actions = {}
+        trace_phase(game, "lobby")
+        trace_action(game, "game_ended_by_admin", admin=user.id)
         for p in game.players.values():
             p.alive = True
             p.role = "civilian"
         save_games()
-        await context.bot.send_message(chat_id=chat.id, text=tr(game, "game_ended_ok"))
-        await query.answer("✅", show_alert=False)
+        await send_traced(context.bot, game, "game_ended_ok", chat_id=chat.id, text=tr(game, "game_ended_ok"))
+        await answer_cb(query, "✅", show_alert=False)
 
     # keep keyboard updated
     try:
@@ -675,7 +1556,7 @@ async def on_vote_pick(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     query = update.callback_query
     parts = (query.data or "").split(":")  # g:vp:<chat_id>:<target_id>
     if len(parts) != 4:
-        await query.answer("—", show_alert=True)
+        await answer_cb(query, "—", show_alert=True)
         return
 
     _, _, chat_id_str, target_id_str = parts
@@ -683,12 +1564,12 @@ async def on_vote_pick(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         chat_id = int(chat_id_str)
         target_id = int(target_id_str)
     except ValueError:
-        await query.answer("—", show_alert=True)
+        await answer_cb(query, "—", show_alert=True)
         return
 
     game = GAMES.get(chat_id)
     if not game or not game.started or not game.voting_open:
-        await query.answer(tr(game or Game(chat_id, {}), "voting_not_open"), show_alert=True)
+        await answer_cb(query, tr(game or Game(chat_id, {}), "voting_not_open"), show_alert=True)
         return
 
     voter_id = query.from_user.id
@@ -696,57 +1577,58 @@ async def on_vote_pick(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     target = game.players.get(target_id)
 
     if not voter or not voter.alive:
-        await query.answer(tr(game, "not_alive_player"), show_alert=True)
+        await answer_cb(query, tr(game, "not_alive_player"), show_alert=True)
         return
     if not target or not target.alive:
-        await query.answer(tr(game, "target_not_alive"), show_alert=True)
+        await answer_cb(query, tr(game, "target_not_alive"), show_alert=True)
         return
 
     game.votes[voter_id] = target_id
+    trace_action(game, "vote", voter=voter_id, target=target_id, votes=len(game.votes))
     save_games()
-    await query.answer(tr(game, "voted_for", name=target.name), show_alert=True)
+    await answer_cb(query, tr(game, "voted_for", name=target.name), show_alert=True)
     await apply_vote_if_majority(context, game)
 
 async def on_dm_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query = update.callback_query
     parts = (query.data or "").split(":")  # dm:killmenu:<chat_id>
     if len(parts) != 3:
-        await query.answer("—", show_alert=True)
+        await answer_cb(query, "—", show_alert=True)
         return
 
     _, menu, chat_id_str = parts
     try:
         chat_id = int(chat_id_str)
     except ValueError:
-        await query.answer("—", show_alert=True)
+        await answer_cb(query, "—", show_alert=True)
         return
 
     game = GAMES.get(chat_id)
     if not game or not game.started:
-        await query.answer("—", show_alert=True)
+        await answer_cb(query, "—", show_alert=True)
         return
 
     actor_id = query.from_user.id
     actor = game.players.get(actor_id)
     if not actor or not actor.alive:
-        await query.answer(tr(game, "not_alive_player"), show_alert=True)
+        await answer_cb(query, tr(game, "not_alive_player"), show_alert=True)
         return
 
     if menu == "killmenu":
         if actor.role != "killer":
-            await query.answer("—", show_alert=True)
+            await answer_cb(query, "—", show_alert=True)
             return
         await query.edit_message_text(tr(game, "dm_choose_victim"), reply_markup=target_list_keyboard(game, CB_DM_KILL_PICK, exclude_ids=[actor_id]))
 
     elif menu == "savemenu":
         if actor.role != "doctor":
-            await query.answer("—", show_alert=True)
+            await answer_cb(query, "—", show_alert=True)
             return
         await query.edit_message_text(tr(game, "dm_choose_save"), reply_markup=target_list_keyboard(game, CB_DM_SAVE_PICK))
 
     elif menu == "invmenu":
         if actor.role != "detective":
-            await query.answer("—", show_alert=True)
+            await answer_cb(query, "—", show_alert=True)
             return
         await query.edit_message_text(tr(game, "dm_choose_inv"), reply_markup=target_list_keyboard(game, CB_DM_INV_PICK, exclude_ids=[actor_id]))
 
@@ -754,7 +1636,7 @@ async def on_dm_pick(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     query = update.callback_query
     parts = (query.data or "").split(":")  # dm:kill:<chat_id>:<target_id>
     if len(parts) != 4:
-        await query.answer("—", show_alert=True)
+        await answer_cb(query, "—", show_alert=True)
         return
 
     _, action, chat_id_str, target_id_str = parts
@@ -762,12 +1644,12 @@ async def on_dm_pick(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         chat_id = int(chat_id_str)
         target_id = int(target_id_str)
     except ValueError:
-        await query.answer("—", show_alert=True)
+        await answer_cb(query, "—", show_alert=True)
         return
 
     game = GAMES.get(chat_id)
     if not game or not game.started:
-        await query.answer("—", show_alert=True)
+        await answer_cb(query, "—", show_alert=True)
         return
 
     actor_id = query.from_user.id
@@ -775,57 +1657,70 @@ async def on_dm_pick(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
     target = game.players.get(target_id)
 
     if not actor or not actor.alive:
-        await query.answer(tr(game, "not_alive_player"), show_alert=True)
+        await answer_cb(query, tr(game, "not_alive_player"), show_alert=True)
         return
     if not target or not target.alive:
-        await query.answer(tr(game, "target_not_alive"), show_alert=True)
+        await answer_cb(query, tr(game, "target_not_alive"), show_alert=True)
         return
 
     if action == "kill":
         if actor.role != "killer" or target_id == actor_id:
-            await query.answer("—", show_alert=True)
+            await answer_cb(query, "—", show_alert=True)
             return
         game.pending_kill_target = target_id
+        trace_action(game, "pick:kill")  # no actor: traces must not reveal roles
         save_games()
-        await query.answer("✅", show_alert=False)
+        await answer_cb(query, "✅", show_alert=False)
         await query.edit_message_text(tr(game, "dm_selected_wait_doctor", name=target.name))
         await resolve_night_if_ready(context, game)
 
     elif action == "save":
         if actor.role != "doctor":
-            await query.answer("—", show_alert=True)
+            await answer_cb(query, "—", show_alert=True)
             return
         game.pending_save_target = target_id
+        trace_action(game, "pick:save")  # no actor: traces must not reveal roles
         save_games()
-        await query.answer("✅", show_alert=False)
+        await answer_cb(query, "✅", show_alert=False)
         await query.edit_message_text(tr(game, "dm_selected_wait_killer", name=target.name))
         await resolve_night_if_ready(context, game)
 
     elif action == "inv":
         if actor.role != "detective" or target_id == actor_id:
-            await query.answer("—", show_alert=True)
+            await answer_cb(query, "—", show_alert=True)
             return
         game.pending_investigation_target = target_id
+        trace_action(game, "pick:inv")  # no actor: traces must not reveal roles
+        if target.role == "killer":
+            count_action(game, "detective", "investigations")
         save_games()
-        await query.answer("✅", show_alert=False)
+        await answer_cb(query, "✅", show_alert=False)
         await query.edit_message_text(tr(game, "dm_invest_done", name=target.name))
 
         rname = role_name(game, target.role)
-        await context.bot.send_message(
+        await send_traced(
+            context.bot, game, "invest_result",
             chat_id=actor_id,
             text=tr(game, "dm_invest_result", name=target.name, role=rname, icon=ROLE_ICONS[target.role]),
             parse_mode=ParseMode.HTML,
         )
 
 async def noop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await update.callback_query.answer()
+    await answer_cb(update.callback_query)
 
 async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
-    logger.exception("Update caused error: %s", context.error)
+    logger.error("Update caused error: %s", context.error, exc_info=context.error)
 
 # -------------------- Main --------------------
 def main() -> None:
+    global BOOT_T0
+    BOOT_T0 = time.monotonic()
+    setup_logging()
+    validate_locales()
     load_games()
+    load_dm_cache()
+    load_stats()
+    logger.info("Loaded %d games in %.3fs", len(GAMES), time.monotonic() - BOOT_T0)
 
     token = os.environ.get("BOT_TOKEN")
     if not token:
@@ -838,10 +1733,21 @@ def main() -> None:
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
 
-    app = ApplicationBuilder().token(token).build()
+    app = (
+        ApplicationBuilder()
+        .token(token)
+        .post_init(on_post_init)
+        .post_stop(on_post_stop)
+        .build()
+    )
+
+    app.add_handler(TypeHandler(Update, bind_log_context), group=-2)
+    app.add_handler(CallbackQueryHandler(guard_callbacks), group=-1)
 
     app.add_handler(CommandHandler("start", cmd_start))
     app.add_handler(CommandHandler("status", cmd_status))
+    app.add_handler(CommandHandler("leaderboard", cmd_leaderboard))
+    app.add_handler(CommandHandler("trace", cmd_trace))
 
     app.add_handler(CallbackQueryHandler(on_group_button, pattern=r"^g:(join|leave|start|players|vote|end|lang)$"))
     app.add_handler(CallbackQueryHandler(on_vote_pick, pattern=r"^g:vp:"))
@@ -855,7 +1761,7 @@ def main() -> None:
     app.add_error_handler(on_error)
 
     logger.info("Bot starting...")
-    app.run_polling()
+    app.run_polling(allowed_updates=ALLOWED_UPDATES, drop_pending_updates=STARTUP_BACKLOG == "drop")
 
 if __name__ == "__main__":
     main()